@@ -1,10 +1,39 @@
 
+import base64
+import csv
+import gzip
 import io
 import json
+from functools import partial
+import numpy as np
 import pandas as pd
 import streamlit as st
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
 from streamlit.components.v1 import html as st_html
 
+# Arrow-backed strings make the .str ops in build_buyers faster when pyarrow is available;
+# the Parquet download is only offered with it
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = "string[pyarrow]"
+except Exception:
+    pyarrow = None
+    TEXT_DTYPE = "string"
+
+# Faster .xlsx writer; write_xlsx_rows falls back to openpyxl write-only mode without it
+try:
+    import xlsxwriter
+except Exception:
+    xlsxwriter = None
+
+# Rust-based .xlsx reader; read_sheet uses it when installed, else openpyxl streaming
+try:
+    import python_calamine  # noqa: F401
+except Exception:
+    python_calamine = None
+
 # ---------------- Page / constants ----------------
 st.set_page_config(page_title="Raffle Wheel", page_icon="🎟️", layout="centered")
 
@@ -16,23 +45,89 @@ REQUIRED_COLUMNS = {
     "Tickets Purchased": "R",
 }
 
-def clean_cell(x):
-    if pd.isna(x):
-        return ""
-    return str(x).strip()
+def cell_text(v):
+    """Text form of a worksheet value, matching read_excel(dtype=str)."""
+    if v is None:
+        return None
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def list_sheets(data: bytes):
+    if python_calamine is not None:
+        return pd.ExcelFile(io.BytesIO(data), engine="calamine").sheet_names
+    wb = load_workbook(io.BytesIO(data), read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
 
-def build_entries(df: pd.DataFrame, id_value: str = "6610", separator: str = " - "):
+@st.cache_data(max_entries=4, show_spinner=False)
+def read_sheet(data: bytes, sheet_name: str, columns=None) -> pd.DataFrame:
     """
-    Filter by ID1==id_value, compose "Full Name - Email1 - Phone Number",
-    and repeat rows by Tickets Purchased.
+    Load one worksheet as text, with calamine when it is installed and
+    otherwise openpyxl's read-only (streaming) mode, so the full cell/style
+    tree is never built in memory. If `columns` is given, only those
+    (stripped) headers are read; a repeated header keeps its first column.
     """
-    df = df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
+    if python_calamine is not None:
+        wanted = None if columns is None else set(columns)
+        df = pd.read_excel(
+            io.BytesIO(data), sheet_name=sheet_name, dtype=str, engine="calamine",
+            usecols=None if wanted is None else (lambda c: str(c).strip() in wanted),
+        )
+        df.columns = [str(c).strip() for c in df.columns]
+        if wanted is not None:
+            df = df.loc[:, ~df.columns.duplicated()]
+        return df
 
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        ws.reset_dimensions()  # don't trust the stored sheet size
+        rows = ws.iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            return pd.DataFrame()
+        first = list(first)
+        while first and first[-1] is None:
+            first.pop()
+        header = [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(first)]
+        if columns is None:
+            keep = list(range(len(header)))
+        else:
+            wanted = set(columns)
+            keep = [i for i, c in enumerate(header) if c in wanted and header.index(c) == i]
+
+        data_rows, last_used = [], 0
+        for r in rows:
+            n = len(r)
+            vals = [cell_text(r[i]) if i < n else None for i in keep]
+            data_rows.append(vals)
+            if any(v is not None for v in vals):
+                last_used = len(data_rows)
+        del data_rows[last_used:]  # trailing blank rows, as read_excel drops them
+    finally:
+        wb.close()
+    return pd.DataFrame(data_rows, columns=[header[i] for i in keep], dtype=object)
+
+def empty_buyers() -> pd.DataFrame:
+    return pd.DataFrame({"Entry": pd.Categorical([]), "Tickets": np.array([], dtype=np.int64)})
+
+def build_buyers(df: pd.DataFrame, id_value: str = "6610", separator: str = " - "):
+    """
+    Filter by ID1==id_value and compose "Full Name - Email1 - Phone Number"
+    once per buyer. Returns one row per buyer with tickets > 0 (categorical
+    "Entry" plus "Tickets"); expand_entries() turns that into one row per ticket.
+    """
+    # Validate against the stripped headers before touching the frame
+    new_cols = [str(c).strip() for c in df.columns]
+    present = set(new_cols)
+    missing = [c for c in REQUIRED_COLUMNS if c not in present]
     if missing:
         return (
-            pd.DataFrame(columns=["Entry"]),
+            empty_buyers(),
             {
                 "ok": False,
                 "message": "Missing required column(s): "
@@ -40,13 +135,22 @@ def build_entries(df: pd.DataFrame, id_value: str = "6610", separator: str = " -
             },
         )
 
-    # Filter by ID1
-    id_series = df["ID1"].astype(str).str.strip()
-    filtered = df[id_series == str(id_value).strip()].copy()
+    # Normalise headers on a shallow copy: the column data is shared, not cloned
+    if new_cols != list(df.columns):
+        df = df.copy(deep=False)
+        df.columns = new_cols
+
+    # Filter by ID1 before anything else so later steps only see kept rows.
+    # Stripped string compare, same rule as raffle_streamlit_app; NaN IDs never match.
+    ids = df["ID1"]
+    if not pd.api.types.is_string_dtype(ids):
+        ids = ids.astype(str)
+    mask = ids.str.strip().eq(str(id_value).strip()).to_numpy(dtype=bool, na_value=False)
+    filtered = df.loc[mask, ["Full Name", "Email1", "Phone Number", "Tickets Purchased"]]
 
     if filtered.empty:
         return (
-            pd.DataFrame(columns=["Entry"]),
+            empty_buyers(),
             {
                 "ok": True,
                 "message": "No rows matched the ID filter.",
@@ -58,50 +162,141 @@ def build_entries(df: pd.DataFrame, id_value: str = "6610", separator: str = " -
             },
         )
 
-    # Build full entry text
-    combined = filtered.apply(
-        lambda r: f"{clean_cell(r['Full Name'])}{separator}"
-                  f"{clean_cell(r['Email1'])}{separator}"
-                  f"{clean_cell(r['Phone Number'])}",
-        axis=1,
-    ).astype(str)
+    # Parse tickets first and drop zero-ticket rows, so the string work
+    # only runs over buyers that actually get entries
+    tickets = pd.to_numeric(filtered["Tickets Purchased"], errors="coerce").fillna(0).to_numpy(dtype=np.int64, copy=True)
+    np.clip(tickets, 0, None, out=tickets)
+    nonzero_rows = int(np.count_nonzero(tickets))
+    if nonzero_rows < len(tickets):
+        nz = tickets > 0
+        paid, tickets = filtered[nz], tickets[nz]
+    else:
+        paid = filtered
 
-    # Repeat by tickets
-    tickets = pd.to_numeric(filtered["Tickets Purchased"], errors="coerce").fillna(0).astype(int).clip(lower=0)
-    repeated = combined.repeat(tickets)
-    out_df = pd.DataFrame({"Entry": repeated.values})
+    # Build full entry text (vectorized, no per-row Python)
+    fn = paid["Full Name"].fillna("").astype(TEXT_DTYPE).str.strip()
+    em = paid["Email1"].fillna("").astype(TEXT_DTYPE).str.strip()
+    ph = paid["Phone Number"].fillna("").astype(TEXT_DTYPE).str.strip()
+    combined = fn + separator + em + separator + ph
+
+    buyers = pd.DataFrame({
+        "Entry": pd.Categorical(combined),
+        "Tickets": tickets,
+    })
 
     info = {
         "ok": True,
         "message": "Success",
         "kept_rows": len(filtered),
         "total_rows": len(df),
-        "generated_entries": len(out_df),
-        "nonzero_ticket_rows": int((tickets > 0).sum()),
-        "zero_ticket_rows": int((tickets == 0).sum()),
+        "generated_entries": int(buyers["Tickets"].sum()),
+        "nonzero_ticket_rows": nonzero_rows,
+        "zero_ticket_rows": len(filtered) - nonzero_rows,
     }
-    return out_df, info
+    return buyers, info
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_build_buyers(data: bytes, sheet_name: str, id_value: str, separator: str):
+    """build_buyers over the cached sheet; reruns with the same upload/options skip both."""
+    df = read_sheet(data, sheet_name, columns=REQUIRED_COLUMNS)
+    return build_buyers(df, id_value=id_value, separator=separator)
 
-def to_excel_bytes(df: pd.DataFrame, header: bool = True) -> bytes:
+def expand_entries(buyers: pd.DataFrame) -> pd.DataFrame:
+    """
+    One "Entry" row per ticket. Only the small category codes are repeated;
+    each distinct entry string is stored once however many tickets it has.
+    """
+    cat = buyers["Entry"].cat
+    codes = np.repeat(cat.codes.to_numpy(), buyers["Tickets"].to_numpy(dtype=np.int64, copy=False))
+    return pd.DataFrame({"Entry": pd.Categorical.from_codes(codes, cat.categories)})
+
+def preview_entries(buyers: pd.DataFrame, k: int = 30) -> pd.DataFrame:
+    """First `k` rows of expand_entries(buyers), expanding only the buyers that reach into them."""
+    n = int(np.searchsorted(np.cumsum(buyers["Tickets"].to_numpy()), k)) + 1
+    return expand_entries(buyers.iloc[:n]).head(k)
+
+def entries_csv_bytes(buyers: pd.DataFrame, header: bool = True) -> bytes:
+    """
+    CSV with one row per ticket, written straight from the (entry, tickets)
+    pairs so the expanded entry list is never materialized for it.
+    """
+    buf = io.BytesIO()
+    text = io.TextIOWrapper(buf, encoding="utf-8", newline="")
+    w = csv.writer(text, lineterminator="\n")
+    if header:
+        w.writerow(["Entry"])
+    for entry, n in zip(buyers["Entry"].tolist(), buyers["Tickets"].tolist()):
+        w.writerows([[entry]] * n)
+    text.flush()
+    text.detach()
+    return buf.getvalue()
+
+# Header cell style pandas' to_excel used: bold, thin border, centred
+HEADER_STYLE = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+def openpyxl_header_row(ws, names):
+    """Header cells for a write-only openpyxl sheet, styled like HEADER_STYLE."""
+    thin = Side(style="thin")
+    cells = []
+    for name in names:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        cells.append(cell)
+    return cells
+
+def write_xlsx_rows(columns, rows, header: bool = True) -> bytes:
+    """One-sheet .xlsx from an iterable of row tuples, streamed row by row."""
     buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, header=header, sheet_name="Entries")
-    buf.seek(0)
-    return buf.read()
+    if xlsxwriter is not None:
+        # constant_memory flushes each row to a temp file as it is written (in_memory
+        # would switch it off); cells are plain strings, never formulas/links
+        wb = xlsxwriter.Workbook(buf, {"constant_memory": True})
+        ws = wb.add_worksheet("Entries")
+        r = 0
+        if header:
+            head = wb.add_format(HEADER_STYLE)
+            for c, name in enumerate(columns):
+                ws.write_string(r, c, str(name), head)
+            r += 1
+        for row in rows:
+            for c, v in enumerate(row):
+                ws.write_string(r, c, "" if v is None else str(v))
+            r += 1
+        wb.close()
+        return buf.getvalue()
+
+    # Write-only workbook streams rows out instead of keeping every cell in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Entries")
+    if header:
+        ws.append(openpyxl_header_row(ws, columns))
+    for row in rows:
+        ws.append(row)
+    wb.save(buf)
+    return buf.getvalue()
+
+def entries_excel_bytes(buyers: pd.DataFrame, header: bool = True) -> bytes:
+    """Like entries_csv_bytes: one row per ticket, streamed from the (entry, tickets) pairs."""
+    rows = (
+        (entry,)
+        for entry, n in zip(buyers["Entry"].tolist(), buyers["Tickets"].tolist())
+        for _ in range(n)
+    )
+    return write_xlsx_rows(["Entry"], rows, header=header)
 
-# ---------------- JS wheel renderer ----------------
-import json
+def entries_parquet_bytes(buyers: pd.DataFrame) -> bytes:
+    """Parquet of the (Entry, Tickets) pairs; columnar readers can repeat them if needed."""
+    buf = io.BytesIO()
+    buyers.to_parquet(buf, index=False)
+    return buf.getvalue()
 
-def render_wheel(display_names, full_entries):
-    init = {
-        "labels": [str(x) for x in display_names],
-        "fulls":  [str(x) for x in full_entries],
-        "durationMs": 5000,
-        "minSpins": 6,
-        "maxSpins": 6
-    }
+# ---------------- JS wheel renderer ----------------
+WHEEL_HEIGHT = 820
 
-    html = """
+# Built once at import; render_wheel() only splices in the INIT payload.
+WHEEL_HTML = """
 <div style="display:flex;flex-direction:column;align-items:center;gap:14px;">
   <h1 style="margin:0 0 8px 0;font-weight:800;font-size:28px;">🎰 Spin the Wheel</h1>
 
@@ -126,30 +321,75 @@ def render_wheel(display_names, full_entries):
   <div id="count"  style="color:#6B7280;"></div>
 </div>
 
-<script>
-const INIT = __INIT_JSON__;
-
-let labels = [...INIT.labels];
-let fulls  = [...INIT.fulls];
+<script type="module">
+// Large pools arrive gzipped + base64'd ({"gz": ...}); see render_wheel
+async function unpackInit(p){
+  if (!p.gz) return p;
+  const bytes = Uint8Array.from(atob(p.gz), c=>c.charCodeAt(0));
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+  return JSON.parse(await new Response(stream).text());
+}
+const INIT = await unpackInit(__INIT_JSON__);
+
+// One slot per distinct entry; weights[i] = tickets left behind slot i.
+// labels/fulls never change: eliminating flips activeMask and the wheel is
+// drawn from the compacted liveIdx (slice j shows slot liveIdx[j]).
+const labels = INIT.labels;
+const fulls  = INIT.fulls;
+const INIT_WEIGHTS = Int32Array.from(INIT.weights || labels.map(()=>1));
+const weights = INIT_WEIGHTS.slice();
+const activeMask = new Uint8Array(labels.length).fill(1);
+const liveIdx = new Int32Array(labels.length);
+let liveCount = 0;
+function rebuildLive(){
+  let k = 0;
+  for (let i=0;i<labels.length;i++) if (activeMask[i]) liveIdx[k++] = i;
+  liveCount = k;
+}
+rebuildLive();
+let starts = [0];       // cumulative slice start angles (radians), length n+1
+let midRad = [], cosMid = [], sinMid = [], colors = [];   // per-slice, see rebuildSlices()
+let fontCache = new Map();   // label text -> fitted font size
+let cachedSize = 0;          // css size of the canvas, refreshed in setupCanvas
+let totalWeight = 0;
 let rotation = 0;
 let spinning = false;
 let lastIdx = null;
+let wheelBitmap = null;   // wedges + labels rendered once; frames just rotate it
+let bitmapRot = 0;        // rotation the bitmap was painted at
 
 const canvas = document.getElementById('wheel');
 const ctx = canvas.getContext('2d');
 
+// The canvas is pinned to a px size, so measure its container instead
+function wheelCssSize(){ return Math.min(canvas.parentElement.getBoundingClientRect().width, 560); }
+
 function setupCanvas(){
   const dpr = window.devicePixelRatio || 1;
-  const rect = canvas.getBoundingClientRect();
-  const size = Math.min(rect.width, 560);
+  const size = cachedSize = wheelCssSize();
   canvas.style.width = size + "px";
   canvas.style.height = size + "px";
   canvas.width = Math.floor(size * dpr);
   canvas.height = Math.floor(size * dpr);
   ctx.setTransform(dpr,0,0,dpr,0,0);
+  wheelBitmap = null; fontCache = new Map();
 }
 setupCanvas();
-window.addEventListener('resize', ()=>{ setupCanvas(); draw(rotation); });
+// Resizes are coalesced to one rAF and only rebuild the canvas (and the
+// cached wheel layers) when its css size or backing-store size really changed
+let resizeQueued = false;
+function onResize(){
+  if (resizeQueued) return;
+  resizeQueued = true;
+  requestAnimationFrame(()=>{
+    resizeQueued = false;
+    const size = wheelCssSize();
+    if (size === cachedSize && Math.floor(size * (window.devicePixelRatio || 1)) === canvas.width) return;
+    setupCanvas(); if (!spinning) draw(rotation);
+  });
+}
+if (typeof ResizeObserver !== "undefined") new ResizeObserver(onResize).observe(canvas.parentElement);
+window.addEventListener('resize', onResize);   // dpr changes (zoom) don't always resize the container
 
 function hsv(i,n){
   const h=(i/Math.max(1,n))%1,s=.75,v=.95;
@@ -158,68 +398,121 @@ function hsv(i,n){
   return `rgb(${Math.round(r*255)},${Math.round(g*255)},${Math.round(b*255)})`;
 }
 function mod(a,n){return ((a%n)+n)%n}
+
+// Slice i spans [starts[i], starts[i+1]) with angle proportional to its tickets.
+// Everything per-slice that the painter needs (mid-angle trig, colour) is
+// computed here, once per change to the slice set.
+function rebuildSlices(){
+  const n = liveCount;
+  totalWeight = 0;
+  for (let i=0;i<n;i++) totalWeight += weights[liveIdx[i]];
+  starts = [0];
+  for (let i=0, acc=0;i<n;i++){ acc += weights[liveIdx[i]]; starts.push(2*Math.PI*acc/(totalWeight||1)); }
+  midRad = new Array(n); cosMid = new Array(n); sinMid = new Array(n); colors = new Array(n);
+  for (let i=0;i<n;i++){
+    midRad[i] = (starts[i]+starts[i+1])/2;
+    cosMid[i] = Math.cos(midRad[i]); sinMid[i] = Math.sin(midRad[i]);
+    colors[i] = hsv(i,n);
+  }
+}
+
+// Shrink-to-fit font size per label text; only depends on text + wheel size.
+const FONT_CSS = {};
+for (let f=9; f<=18; f++) FONT_CSS[f] = `700 ${f}px system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif`;
+function fitFont(ctx, name, maxW){
+  let font = fontCache.get(name);
+  if (font !== undefined) return font;
+  font = 18;
+  ctx.font = FONT_CSS[font];
+  let w = ctx.measureText(name).width;
+  while (w > maxW && font > 9){
+    font -= 1;
+    ctx.font = FONT_CSS[font];
+    w = ctx.measureText(name).width;
+  }
+  fontCache.set(name, font);
+  return font;
+}
+rebuildSlices();
 function easeOutCubic(t){return 1-Math.pow(1-t,3)}
 
-function draw(rot=0){
-  const rect = canvas.getBoundingClientRect(), S = rect.width;
+// Wedges + labels at rotation `rot`, painted into `ctx` (S x S css px).
+function paintWheel(ctx, rot, S){
   const CX=S/2, CY=S/2, R=S*0.46, innerR=R*0.18, labelStart=innerR+10, labelEnd=R*0.90;
 
-  ctx.clearRect(0,0,S,S);
-
-  const n = Math.max(1, labels.length), slice = 2*Math.PI/n;
+  const n = liveCount;
 
   // wedges
   for(let i=0;i<n;i++){
-    const a1 = rot + i*slice, a2 = rot + (i+1)*slice;
+    const a1 = rot + starts[i], a2 = rot + starts[i+1];
     ctx.beginPath(); ctx.moveTo(CX,CY); ctx.arc(CX,CY,R,a1,a2,false); ctx.closePath();
-    ctx.fillStyle = hsv(i,n); ctx.fill();
+    ctx.fillStyle = colors[i]; ctx.fill();
     ctx.beginPath(); ctx.arc(CX,CY,R,a1,a1+0.006,false);
     ctx.lineWidth = 2; ctx.strokeStyle = "#fff"; ctx.stroke();
   }
 
-  // labels anchored at the rim, flowing inward
+  // labels anchored at the rim, flowing inward. Invariant text styles are
+  // set once; font/lineWidth live outside the per-slice save() so restore()
+  // keeps them, and are only touched when the fitted size changes.
+  const cosRot = Math.cos(rot), sinRot = Math.sin(rot);
+  const maxW = (labelEnd - labelStart) * 0.95; // don't intrude past inner margin
+  ctx.save();
+  ctx.textBaseline = "middle";
+  ctx.strokeStyle = "rgba(255,255,255,0.9)";
+  ctx.fillStyle = "#111";
+  let curFont = 0;
   for(let i=0;i<n;i++){
-    const a1 = rot + i*slice, a2 = rot + (i+1)*slice, mid = (a1+a2)/2;
-    const name = labels[i];
+    const a1 = rot + starts[i], a2 = rot + starts[i+1], mid = rot + midRad[i];
+    const name = labels[liveIdx[i]];
 
-    // clip to the wedge
-    ctx.save();
-    ctx.beginPath(); ctx.moveTo(CX,CY); ctx.arc(CX,CY,R,a1,a2,false); ctx.closePath(); ctx.clip();
+    const font = fitFont(ctx, name, maxW);   // a cache miss leaves ctx.font at FONT_CSS[font]
+    if (font !== curFont){
+      ctx.font = FONT_CSS[font]; ctx.lineWidth = Math.max(2, Math.floor(font/6)); curFont = font;
+    }
 
+    // clip to the wedge, then turn to its mid-angle
     ctx.save();
+    ctx.beginPath(); ctx.moveTo(CX,CY); ctx.arc(CX,CY,R,a1,a2,false); ctx.closePath(); ctx.clip();
     ctx.translate(CX,CY);
     ctx.rotate(mid);
 
     // keep text upright on the left side
-    const flipped = Math.cos(mid) < 0;
+    const flipped = cosRot*cosMid[i] - sinRot*sinMid[i] < 0;   // cos(mid) < 0
     if (flipped) ctx.rotate(Math.PI);
 
-    const maxW = (labelEnd - labelStart) * 0.95; // don't intrude past inner margin
-
-    // auto-fit
-    let font = 18;
-    ctx.font = `700 ${font}px system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif`;
-    let w = ctx.measureText(name).width;
-    while (w > maxW && font > 9){
-      font -= 1;
-      ctx.font = `700 ${font}px system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif`;
-      w = ctx.measureText(name).width;
-    }
-
     // --- anchor at rim ---
     const x = flipped ? -labelEnd : labelEnd;            // rim position
     ctx.textAlign = flipped ? "left" : "right";          // flow inward
-    ctx.textBaseline = "middle";
-
-    ctx.strokeStyle = "rgba(255,255,255,0.9)";
-    ctx.lineWidth = Math.max(2, Math.floor(font/6));
-    ctx.fillStyle = "#111";
     ctx.strokeText(name, x, 0);
     ctx.fillText(name, x, 0);
 
     ctx.restore();
-    ctx.restore();
   }
+  ctx.restore();
+}
+
+function buildWheelBitmap(rot, S){
+  const off = (typeof OffscreenCanvas !== "undefined")
+    ? new OffscreenCanvas(canvas.width, canvas.height)
+    : Object.assign(document.createElement('canvas'), {width: canvas.width, height: canvas.height});
+  const octx = off.getContext('2d');
+  const dpr = canvas.width / S;
+  octx.setTransform(dpr,0,0,dpr,0,0);
+  paintWheel(octx, rot, S);
+  wheelBitmap = off; bitmapRot = rot;
+}
+
+function draw(rot=0){
+  const S = cachedSize;
+  const CX=S/2, CY=S/2, R=S*0.46, innerR=R*0.18;
+
+  if (!wheelBitmap) buildWheelBitmap(rot, S);
+
+  ctx.clearRect(0,0,S,S);
+  ctx.save();
+  ctx.translate(CX,CY); ctx.rotate(rot - bitmapRot); ctx.translate(-CX,-CY);
+  ctx.drawImage(wheelBitmap, 0, 0, S, S);
+  ctx.restore();
 
   // hub on top
   ctx.beginPath(); ctx.arc(CX,CY,innerR,0,2*Math.PI);
@@ -228,27 +521,49 @@ function draw(rot=0){
 }
 
 function winnerIndex(rot){
-  const n = Math.max(1, labels.length), slice = 2*Math.PI/n;
+  const n = Math.max(1, liveCount);
   const p = mod(0 - rot, 2*Math.PI); // pointer at angle 0 (right)
-  return Math.min(n-1, Math.floor(p / slice));
+  // binary search: last i with starts[i] <= p
+  let lo = 0, hi = n - 1;
+  while (lo < hi){
+    const mid = (lo + hi + 1) >> 1;
+    if (starts[mid] <= p) lo = mid; else hi = mid - 1;
+  }
+  return lo;
+}
+
+// Uniform [0,1) from the browser's CSPRNG (Math.random() only as a fallback)
+const rngBuf = new Uint32Array(1);
+function rand01(){
+  if (window.crypto && crypto.getRandomValues) return crypto.getRandomValues(rngBuf)[0] / 4294967296;
+  return Math.random();
 }
 
 function spin(){
-  if (spinning || labels.length < 2) return;
+  if (spinning || totalWeight < 2) return;
   spinning = true; setElims(true);
   document.getElementById('winner').textContent = "";
 
-  const total = (INIT.maxSpins||6)*2*Math.PI + Math.random()*2*Math.PI;
+  const total = (INIT.maxSpins||6)*2*Math.PI + rand01()*2*Math.PI;
   const dur = Math.max(400, Math.min(10000, INIT.durationMs||5000));
   const t0 = performance.now(), start = rotation;
+  // Cap drawing near 60 fps without halving 90/100 Hz displays: add up the rAF
+  // intervals and draw once a 60 Hz frame's worth (less 2 ms slack) has built up
+  const FRAME_MS = 1000/60, SLACK_MS = 2;
+  let lastT = t0, frameAcc = FRAME_MS;
 
   const frame = (t)=>{
+    frameAcc += t - lastT; lastT = t;
     const p = Math.min(1,(t-t0)/dur), k = easeOutCubic(p);
     rotation = mod(start + total*k, 2*Math.PI);
-    draw(rotation);
+    if (p>=1){ wheelBitmap = null; draw(rotation); }   // repaint so labels end up upright
+    else if (!document.hidden && frameAcc >= FRAME_MS - SLACK_MS){
+      frameAcc = Math.max(0, Math.min(frameAcc - FRAME_MS, FRAME_MS));
+      draw(rotation);
+    }
     if (p<1) requestAnimationFrame(frame);
     else {
-      lastIdx = winnerIndex(rotation);
+      lastIdx = liveIdx[winnerIndex(rotation)];
       const full = fulls[lastIdx] || labels[lastIdx] || "";
       document.getElementById('winner').textContent = "🏆 Winner: " + full;
       setElims(false); spinning = false;
@@ -263,13 +578,14 @@ function setElims(dis){
 }
 function updateCount(){
   document.getElementById('count').textContent =
-    labels.length + " slice" + (labels.length===1?"":"s") + " on wheel";
+    totalWeight + " entr" + (totalWeight===1?"y":"ies") + " on wheel · " +
+    liveCount + " slice" + (liveCount===1?"":"s");
 }
 
 document.getElementById('spinBtn').onclick = spin;
 document.getElementById('resetBtn').onclick = ()=>{
-  labels=[...INIT.labels]; fulls=[...INIT.fulls]; rotation=0; lastIdx=null;
-  setElims(true); document.getElementById('winner').textContent="";
+  weights.set(INIT_WEIGHTS); activeMask.fill(1); rebuildLive(); rotation=0; lastIdx=null;
+  wheelBitmap=null; rebuildSlices(); setElims(true); document.getElementById('winner').textContent="";
   draw(rotation); updateCount();
 };
 document.getElementById('pngBtn').onclick = ()=>{
@@ -277,20 +593,38 @@ document.getElementById('pngBtn').onclick = ()=>{
 };
 document.getElementById('rm1').onclick = ()=>{
   if(lastIdx==null)return;
-  labels.splice(lastIdx,1); fulls.splice(lastIdx,1);
-  lastIdx=null; setElims(true); draw(rotation); updateCount();
+  // one ticket goes; the slice disappears with its last ticket
+  if (--weights[lastIdx] <= 0){ activeMask[lastIdx] = 0; rebuildLive(); }
+  lastIdx=null; wheelBitmap=null; rebuildSlices(); setElims(true); draw(rotation); updateCount();
 };
 document.getElementById('rmAll').onclick = ()=>{
   if(lastIdx==null)return;
-  const n=labels[lastIdx]; const L=[],F=[];
-  for(let i=0;i<labels.length;i++){ if(labels[i]!==n){L.push(labels[i]);F.push(fulls[i]);} }
-  labels=L; fulls=F; lastIdx=null; setElims(true); draw(rotation); updateCount();
+  const n=labels[lastIdx];
+  for(let i=0;i<labels.length;i++) if(labels[i]===n) activeMask[i]=0;
+  rebuildLive(); lastIdx=null; wheelBitmap=null; rebuildSlices(); setElims(true); draw(rotation); updateCount();
 };
 
 draw(rotation); updateCount();
 </script>
 """
-    return html.replace("__INIT_JSON__", json.dumps(init))
+
+# Payloads at least this big are shipped gzipped; smaller ones stay plain JSON
+WHEEL_PACK_MIN = 64 * 1024
+
+def render_wheel(display_names, full_entries, weights=None):
+    init = {
+        "labels": [str(x) for x in display_names],
+        "fulls":  [str(x) for x in full_entries],
+        "weights": [int(w) for w in weights] if weights is not None else [1] * len(full_entries),
+        "durationMs": 5000,
+        "minSpins": 6,
+        "maxSpins": 6
+    }
+    init_json = json.dumps(init, ensure_ascii=False, separators=(",", ":"))
+    if len(init_json) >= WHEEL_PACK_MIN:
+        packed = base64.b64encode(gzip.compress(init_json.encode("utf-8"), mtime=0)).decode("ascii")
+        init_json = json.dumps({"gz": packed})
+    return WHEEL_HTML.replace("__INIT_JSON__", init_json)
 
 # ---------------- UI ----------------
 st.title("🎟️ Raffle Entries Builder")
@@ -309,16 +643,18 @@ df = None
 
 if uploaded is not None:
     try:
-        xls = pd.ExcelFile(uploaded, engine="openpyxl")
-        sheet_name = st.selectbox("Select worksheet", options=xls.sheet_names, index=0)
-        df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str, engine="openpyxl")
-        st.success(f"Loaded **{sheet_name}** with {len(df):,} rows and {len(df.columns)} columns.")
+        raw = uploaded.getvalue()
+        sheet_name = st.selectbox("Select worksheet", options=list_sheets(raw), index=0)
+        df = read_sheet(raw, sheet_name, columns=REQUIRED_COLUMNS)
+        n_rows, n_cols = df.shape
+        st.success(f"Loaded **{sheet_name}** with {n_rows:,} rows ({n_cols} of the required columns found).")
+        st.caption("Preview of the selected columns (other columns in the sheet are not loaded).")
         st.dataframe(df.head(10), use_container_width=True)
     except Exception as e:
         st.exception(e)
 
 if df is not None:
-    out_df, info = build_entries(df, id_value=id_value, separator=separator)
+    buyers, info = cached_build_buyers(raw, sheet_name, id_value, separator)
 
     if not info.get("ok", False):
         st.error(info.get("message", "Unknown error"))
@@ -334,33 +670,53 @@ if df is not None:
         )
 
     st.subheader("Preview of generated entries")
-    st.dataframe(out_df.head(30), use_container_width=True)
-
-    # Downloads
-    excel_bytes = to_excel_bytes(out_df, header=include_header)
-    st.download_button(
-        label="⬇️ Download Excel (.xlsx)",
-        data=excel_bytes,
-        file_name="raffle_entries.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    csv_bytes = out_df.to_csv(index=False, header=include_header).encode("utf-8")
-    st.download_button(
-        label="⬇️ Download CSV (.csv)",
-        data=csv_bytes,
-        file_name="raffle_entries.csv",
-        mime="text/csv",
-    )
+    st.dataframe(preview_entries(buyers, 30), use_container_width=True)
+
+    # Downloads: CSV is cheap and built up front; Excel/Parquet are generated on click
+    cols = st.columns(3 if pyarrow is not None else 2)
+    with cols[0]:
+        st.download_button(
+            label="⬇️ Download Excel (.xlsx)",
+            data=partial(entries_excel_bytes, buyers, header=include_header),
+            file_name="raffle_entries.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+    with cols[1]:
+        st.download_button(
+            label="⬇️ Download CSV (.csv)",
+            data=entries_csv_bytes(buyers, header=include_header),
+            file_name="raffle_entries.csv",
+            mime="text/csv",
+        )
+    if pyarrow is not None:
+        with cols[2]:
+            st.download_button(
+                label="⬇️ Download Parquet (.parquet)",
+                data=partial(entries_parquet_bytes, buyers),
+                file_name="raffle_entries.parquet",
+                mime="application/vnd.apache.parquet",
+                help="One row per buyer with its ticket count (Entry, Tickets).",
+            )
 
     st.divider()
 
-    # Wheel inputs
-    full_entries = out_df["Entry"].fillna("").astype(str).tolist()
-    display_names = [s.split(" - ")[0] for s in full_entries]
-
-    if len(display_names) == 0:
+    # Wheel page (kept in session state; export toggles don't change it, so
+    # reruns reuse the same HTML instead of regrouping and re-serialising)
+    wheel_key = (getattr(uploaded, "file_id", uploaded.name), sheet_name, id_value, separator)
+    cached = st.session_state.get("wheel_page")
+    if cached is None or cached[0] != wheel_key:
+        # One weighted slice per distinct entry, straight from the per-buyer ticket counts
+        tickets = buyers.groupby("Entry", observed=True, sort=False)["Tickets"].sum()
+        full_entries = tickets.index.astype(str).tolist()
+        display_names = pd.Series(full_entries, dtype=object).str.split(" - ", n=1).str[0].tolist()
+        wheel_html = render_wheel(display_names, full_entries, tickets.tolist()) if full_entries else None
+        cached = (wheel_key, wheel_html)
+        st.session_state["wheel_page"] = cached
+    wheel_html = cached[1]
+
+    if wheel_html is None:
         st.warning("No entries to spin. Check the ID filter and that Tickets Purchased > 0.")
     else:
-        st_html(render_wheel(display_names, full_entries), height=820, scrolling=False)
+        st_html(wheel_html, height=WHEEL_HEIGHT, scrolling=False)
 
 st.caption("Required headers: ID1, Full Name, Email1, Phone Number, Tickets Purchased.")
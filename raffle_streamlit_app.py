@@ -1,8 +1,16 @@
+import base64
+import gzip
 import io
 import json
+from functools import partial
+import numpy as np
 import pandas as pd
 import streamlit as st
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
 from streamlit.components.v1 import html as st_html
+from streamlit.errors import StreamlitAPIException
 
 # Read/write page JS from Streamlit (used to read/write localStorage and install a message bridge)
 try:
@@ -10,6 +18,26 @@ try:
 except Exception:  # app still runs; winners table just won't show
     streamlit_js_eval = None
 
+# Arrow-backed strings make the .str ops in build_entries faster when pyarrow is available
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = "string[pyarrow]"
+except Exception:
+    TEXT_DTYPE = "string"
+
+# Faster streaming .xlsx writer; fall back to openpyxl if it isn't installed
+try:
+    import xlsxwriter
+except Exception:
+    xlsxwriter = None
+
+# Rust-based .xlsx reader (python-calamine) is much faster than openpyxl for ingest
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except Exception:
+    EXCEL_ENGINE = "openpyxl"
+
 # ---------------- Page / constants ----------------
 st.set_page_config(page_title="Raffle Wheel", page_icon="🎟️", layout="centered")
 
@@ -21,20 +49,15 @@ REQUIRED_COLUMNS = {
     "Tickets Purchased": "R",
 }
 
-def clean_cell(x):
-    if pd.isna(x):
-        return ""
-    return str(x).strip()
-
 def build_entries(df: pd.DataFrame, id_value: str = "6610", separator: str = " - "):
     """
     Filter by ID1==id_value, compose "Full Name - Email1 - Phone Number",
     and repeat rows by Tickets Purchased.
     """
-    df = df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
-
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    # Validate against the stripped headers before touching the frame
+    new_cols = [str(c).strip() for c in df.columns]
+    present = set(new_cols)
+    missing = [c for c in REQUIRED_COLUMNS if c not in present]
     if missing:
         return (
             pd.DataFrame(columns=["Entry"]),
@@ -45,9 +68,18 @@ def build_entries(df: pd.DataFrame, id_value: str = "6610", separator: str = " -
             },
         )
 
-    # Filter by ID1
-    id_series = df["ID1"].astype(str).str.strip()
-    filtered = df[id_series == str(id_value).strip()].copy()
+    # Normalise headers on a shallow copy: the column data is shared, not cloned
+    if new_cols != list(df.columns):
+        df = df.copy(deep=False)
+        df.columns = new_cols
+
+    # Filter by ID1. Sheets are read with dtype=str, so strip in place rather
+    # than casting the whole column to str first; NaN IDs never match.
+    ids = df["ID1"]
+    if not pd.api.types.is_string_dtype(ids):
+        ids = ids.astype(str)
+    mask = ids.str.strip().eq(str(id_value).strip()).to_numpy(dtype=bool, na_value=False)
+    filtered = df.loc[mask, ["Full Name", "Email1", "Phone Number", "Tickets Purchased"]]
 
     if filtered.empty:
         return (
@@ -63,18 +95,18 @@ def build_entries(df: pd.DataFrame, id_value: str = "6610", separator: str = " -
             },
         )
 
-    # Build full entry text
-    combined = filtered.apply(
-        lambda r: f"{clean_cell(r['Full Name'])}{separator}"
-                  f"{clean_cell(r['Email1'])}{separator}"
-                  f"{clean_cell(r['Phone Number'])}",
-        axis=1,
-    ).astype(str)
+    # Clean the text columns once (NaN -> "", trimmed), then compose the entry text
+    name, email, phone = (
+        filtered[c].fillna("").astype(TEXT_DTYPE).str.strip() for c in ("Full Name", "Email1", "Phone Number")
+    )
+    combined = name + separator + email + separator + phone
 
     # Repeat by tickets
-    tickets = pd.to_numeric(filtered["Tickets Purchased"], errors="coerce").fillna(0).astype(int).clip(lower=0)
-    repeated = combined.repeat(tickets)
-    out_df = pd.DataFrame({"Entry": repeated.values})
+    tickets = pd.to_numeric(filtered["Tickets Purchased"], errors="coerce").fillna(0).to_numpy(dtype=np.intp, copy=True)
+    np.clip(tickets, 0, None, out=tickets)
+    entries = np.repeat(combined.to_numpy(dtype=object), tickets)
+    out_df = pd.DataFrame({"Entry": entries}, copy=False)
+    nonzero = int(np.count_nonzero(tickets))
 
     info = {
         "ok": True,
@@ -82,29 +114,115 @@ def build_entries(df: pd.DataFrame, id_value: str = "6610", separator: str = " -
         "kept_rows": len(filtered),
         "total_rows": len(df),
         "generated_entries": len(out_df),
-        "nonzero_ticket_rows": int((tickets > 0).sum()),
-        "zero_ticket_rows": int((tickets == 0).sum()),
+        "nonzero_ticket_rows": nonzero,
+        "zero_ticket_rows": len(tickets) - nonzero,
     }
     return out_df, info
 
+# ---------------- Cached loaders (survive Streamlit reruns) ----------------
+# Keyed on the upload bytes and shared by every session, so only a few are kept
+@st.cache_data(max_entries=4, show_spinner=False)
+def list_sheets(file_bytes: bytes):
+    return pd.ExcelFile(io.BytesIO(file_bytes), engine=EXCEL_ENGINE).sheet_names
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_sheet(file_bytes: bytes, sheet_name: str) -> pd.DataFrame:
+    # Only the REQUIRED_COLUMNS are materialised; headers are matched after stripping
+    return pd.read_excel(
+        io.BytesIO(file_bytes), sheet_name=sheet_name, dtype=str, engine=EXCEL_ENGINE,
+        usecols=lambda c: str(c).strip() in REQUIRED_COLUMNS,
+    )
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_build_entries(file_bytes: bytes, sheet_name: str, id_value: str, separator: str):
+    return build_entries(load_sheet(file_bytes, sheet_name), id_value=id_value, separator=separator)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_csv(file_bytes: bytes, sheet_name: str, id_value: str, separator: str, header: bool):
+    out_df, _ = cached_build_entries(file_bytes, sheet_name, id_value, separator)
+    return to_csv_bytes(out_df, header=header)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_xlsx(file_bytes: bytes, sheet_name: str, id_value: str, separator: str, header: bool):
+    """Only runs when the Excel button is clicked (passed to download_button as a callable)."""
+    out_df, _ = cached_build_entries(file_bytes, sheet_name, id_value, separator)
+    return to_excel_bytes(out_df, header=header)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def winners_table(winners_json: str) -> pd.DataFrame:
+    """Winners log as a table; live polls that see the same localStorage string reuse it."""
+    try:
+        winners = json.loads(winners_json) if winners_json else []
+    except Exception:
+        winners = []
+    rows = []
+    for i, r in enumerate(winners, start=1):
+        rows.append({
+            "Winner Number": i,
+            "Full Name":     (r.get("name")  or ""),
+            "Email":         (r.get("email") or ""),
+            "Phone Number":  (r.get("phone") or ""),
+        })
+    return pd.DataFrame(rows)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def winners_xlsx(winners_json: str) -> bytes:
+    return to_excel_bytes(winners_table(winners_json), header=True)
+
+# Header cell style pandas' to_excel used: bold, thin border, centred
+HEADER_STYLE = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+def openpyxl_header_row(ws, names):
+    """Header cells for a write-only openpyxl sheet, styled like HEADER_STYLE."""
+    thin = Side(style="thin")
+    cells = []
+    for name in names:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        cells.append(cell)
+    return cells
+
 def to_excel_bytes(df: pd.DataFrame, header: bool = True) -> bytes:
     buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, header=header, sheet_name="Entries")
-    buf.seek(0)
-    return buf.read()
+    if xlsxwriter is not None:
+        # constant_memory needs rows written in order, so write them here rather
+        # than through pd.ExcelWriter (which fills the sheet column by column).
+        # No in_memory: xlsxwriter switches constant_memory off when it is set.
+        wb = xlsxwriter.Workbook(buf, {"constant_memory": True,
+                                       "strings_to_formulas": False, "strings_to_urls": False})
+        ws = wb.add_worksheet("Entries")
+        r = 0
+        if header:
+            ws.write_row(r, 0, [str(c) for c in df.columns], wb.add_format(HEADER_STYLE))
+            r += 1
+        for row in df.itertuples(index=False, name=None):
+            ws.write_row(r, 0, [None if pd.isna(v) else v for v in row])
+            r += 1
+        wb.close()
+        return buf.getvalue()
+
+    # openpyxl fallback: a write-only workbook streams rows instead of holding every cell
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Entries")
+    if header:
+        ws.append(openpyxl_header_row(ws, df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append([None if pd.isna(v) else v for v in row])
+    wb.save(buf)
+    return buf.getvalue()
+
+def to_csv_bytes(df: pd.DataFrame, header: bool = True) -> bytes:
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, header=header, encoding="utf-8", lineterminator="\n")
+    return buf.getvalue()
 
 # ---------------- JS wheel renderer ----------------
-def render_wheel(display_names, full_entries):
-    init = {
-        "labels": [str(x) for x in display_names],   # what shows on each slice
-        "fulls":  [str(x) for x in full_entries],    # full "Name - Email - Phone" (winner line)
-        "durationMs": 5000,
-        "minSpins": 6,
-        "maxSpins": 6
-    }
+WHEEL_HEIGHT = 820
 
-    html = """
+# Static page for the wheel iframe; only the __INIT_JSON__ payload changes
+WHEEL_HTML = """
 <div style="display:flex;flex-direction:column;align-items:center;gap:14px;">
   <h1 style="margin:0 0 8px 0;font-weight:800;font-size:28px;">🎰 Spin the Wheel</h1>
 
@@ -129,129 +247,343 @@ def render_wheel(display_names, full_entries):
   <div id="count"  style="color:#6B7280;"></div>
 </div>
 
-<script>
-const INIT = __INIT_JSON__;
-
-let labels = [...INIT.labels];
-let fulls  = [...INIT.fulls];
+<script type="module">
+// Large pools arrive gzipped + base64'd ({"gz": ...}); see build_wheel_html
+async function unpackInit(p){
+  if (!p.gz) return p;
+  const bytes = Uint8Array.from(atob(p.gz), c=>c.charCodeAt(0));
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+  return JSON.parse(await new Response(stream).text());
+}
+const INIT = await unpackInit(__INIT_JSON__);
+
+// One slot per distinct entry; weights[i] = tickets left behind slot i.
+// labels/fulls never change: eliminating flips activeMask and the wheel is
+// drawn from the compacted liveIdx (slice j shows slot liveIdx[j]).
+const labels = INIT.labels;
+const fulls  = INIT.fulls;
+const INIT_WEIGHTS = Int32Array.from(INIT.weights || labels.map(()=>1));
+const weights = INIT_WEIGHTS.slice();
+const activeMask = new Uint8Array(labels.length).fill(1);
+const liveIdx = new Int32Array(labels.length);
+let liveCount = 0;
+function rebuildLive(){
+  let k = 0;
+  for (let i=0;i<labels.length;i++) if (activeMask[i]) liveIdx[k++] = i;
+  liveCount = k;
+}
+rebuildLive();
+let nameSlots = null;   // label -> slot indices, built on first "Eliminate All"
+let starts = new Float64Array(1);   // cumulative slice start angles (radians), length n+1
+let midRad = new Float64Array(0), cosMid = new Float64Array(0), sinMid = new Float64Array(0);
+let totalWeight = 0;
 let rotation = 0;
 let spinning = false;
 let lastIdx = null;
+let slicePaths = null, sepPath = null, diskPath = null, hubPath = null;  // cached Path2D shapes
+let wedgePattern = null;  // pre-rendered wedges (CanvasPattern, unrotated)
+let wheelBitmap = null;   // pre-rendered labels
+let bitmapRot = 0;        // rotation the bitmap was painted at
+let fontCache = new Map(); // label text -> fitted font size
+let cachedSize = 0, cachedDpr = 1;  // css size / dpr, refreshed only in setupCanvas
 
 const canvas = document.getElementById('wheel');
 const ctx = canvas.getContext('2d');
 
+// The canvas is pinned to a px size, so measure its container instead
+function wheelCssSize(){ return Math.min(canvas.parentElement.getBoundingClientRect().width, 560); }
+
 function setupCanvas(){
-  const dpr = window.devicePixelRatio || 1;
-  const rect = canvas.getBoundingClientRect();
-  const size = Math.min(rect.width, 560);
+  const dpr = cachedDpr = window.devicePixelRatio || 1;
+  const size = cachedSize = wheelCssSize();
   canvas.style.width = size + "px";
   canvas.style.height = size + "px";
   canvas.width = Math.floor(size * dpr);
   canvas.height = Math.floor(size * dpr);
   ctx.setTransform(dpr,0,0,dpr,0,0);
+  slicePaths = null; wedgePattern = null; wheelBitmap = null; fontCache = new Map();
 }
 setupCanvas();
-window.addEventListener('resize', ()=>{ setupCanvas(); draw(rotation); });
-
-function hsv(i,n){
-  const h=(i/Math.max(1,n))%1,s=.75,v=.95;
-  const f=h*6,p=v*(1-s),q=v*(1-(f%1)*s),t=v*(1-(1-f%1)*s),m=Math.floor(f)%6;
-  const r=[v,q,p,p,t,v][m],g=[t,v,v,q,p,p][m],b=[p,p,t,v,v,q][m];
-  return `rgb(${Math.round(r*255)},${Math.round(g*255)},${Math.round(b*255)})`;
+// Resizes are coalesced to one rAF and only rebuild the canvas (and the
+// cached wheel layers) when its css size or backing-store size really changed
+let resizeQueued = false;
+function onResize(){
+  if (resizeQueued) return;
+  resizeQueued = true;
+  requestAnimationFrame(()=>{
+    resizeQueued = false;
+    const size = wheelCssSize();
+    if (size === cachedSize && Math.floor(size * (window.devicePixelRatio || 1)) === canvas.width) return;
+    setupCanvas(); requestRender();
+  });
 }
-function mod(a,n){return ((a%n)+n)%n}
-function easeOutCubic(t){return 1-Math.pow(1-t,3)}
+if (typeof ResizeObserver !== "undefined") new ResizeObserver(onResize).observe(canvas.parentElement);
+window.addEventListener('resize', onResize);   // dpr changes (zoom) don't always resize the container
+
+// Wedge colours depend only on the slice count, so build the whole '#rrggbb'
+// table in one pass (fixed s=.75, v=.95 hue sweep) whenever labels change.
+let colorCache = [];
+function rebuildColorCache(){
+  const n = Math.max(1, liveCount);
+  const V = Math.round(.95*255), P = Math.round(.95*.25*255);
+  colorCache = new Array(n);
+  for (let i=0;i<n;i++){
+    const f = (i/n)*6, m = Math.floor(f) % 6, fr = f - Math.floor(f);
+    const q = Math.round(.95*(1 - fr*.75)*255), t = Math.round(.95*(1 - (1-fr)*.75)*255);
+    let r, g, b;
+    switch (m){
+      case 0: r=V; g=t; b=P; break;
+      case 1: r=q; g=V; b=P; break;
+      case 2: r=P; g=V; b=t; break;
+      case 3: r=P; g=q; b=V; break;
+      case 4: r=t; g=P; b=V; break;
+      default: r=V; g=P; b=q;
+    }
+    colorCache[i] = '#' + ((r<<16)|(g<<8)|b).toString(16).padStart(6,'0');
+  }
+}
+rebuildColorCache();
+
+// Slice i spans [starts[i], starts[i+1]) with angle proportional to its weight.
+function rebuildSlices(){
+  const n = liveCount;
+  totalWeight = 0;
+  for (let j=0;j<n;j++) totalWeight += weights[liveIdx[j]];
+  starts = new Float64Array(Math.max(1, n+1));
+  for (let j=0, acc=0;j<n;j++){ acc += weights[liveIdx[j]]; starts[j+1] = 2*Math.PI*acc/(totalWeight||1); }
+  if (n) starts[n] = 2*Math.PI;
+  midRad = new Float64Array(n); cosMid = new Float64Array(n); sinMid = new Float64Array(n);
+  for (let j=0;j<n;j++){
+    const m = midRad[j] = (starts[j]+starts[j+1])/2;
+    cosMid[j] = Math.cos(m); sinMid[j] = Math.sin(m);
+  }
+}
+rebuildSlices();
 
-function draw(rot=0){
-  const rect = canvas.getBoundingClientRect(), S = rect.width;
-  const CX=S/2, CY=S/2, R=S*0.46, innerR=R*0.18, labelStart=innerR+10, labelEnd=R*0.90;
+function labelsChanged(){
+  slicePaths = null; wedgePattern = null; wheelBitmap = null; rebuildColorCache(); rebuildSlices();
+}
 
-  ctx.clearRect(0,0,S,S);
+function mod(a,n){return ((a%n)+n)%n}
 
-  const n = Math.max(1, labels.length), slice = 2*Math.PI/n;
+// Auto-fit font size per label text. The fit only depends on the text and the
+// wheel size, so fontCache keeps it (cleared in setupCanvas) instead of re-measuring.
+const FONT_CSS = {};
+for (let f=9; f<=18; f++) FONT_CSS[f] = `700 ${f}px system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif`;
+function fitFont(ctx, name, maxW){
+  let font = fontCache.get(name);
+  if (font !== undefined) return font;
+  font = 18;
+  ctx.font = FONT_CSS[font];
+  let w = ctx.measureText(name).width;
+  while (w > maxW && font > 9){
+    font -= 1;
+    ctx.font = FONT_CSS[font];
+    w = ctx.measureText(name).width;
+  }
+  fontCache.set(name, font);
+  return font;
+}
 
-  // wedges
-  for(let i=0;i<n;i++){
-    const a1 = rot + i*slice, a2 = rot + (i+1)*slice;
-    ctx.beginPath(); ctx.moveTo(CX,CY); ctx.arc(CX,CY,R,a1,a2,false); ctx.closePath();
-    ctx.fillStyle = hsv(i,n); ctx.fill();
-    ctx.beginPath(); ctx.arc(CX,CY,R,a1,a1+0.006,false);
-    ctx.lineWidth = 2; ctx.strokeStyle = "#fff"; ctx.stroke();
+// Wheel shapes as Path2D, centred on (0,0); rebuilt when the slice set or size changes.
+function buildPaths(S){
+  const R=S*0.46, innerR=R*0.18, n = liveCount;
+  slicePaths = new Array(n);
+  sepPath = new Path2D();
+  for (let i=0;i<n;i++){
+    const p = new Path2D();
+    p.moveTo(0,0); p.arc(0,0,R,starts[i],starts[i+1],false); p.closePath();
+    slicePaths[i] = p;
+    sepPath.moveTo(R*Math.cos(starts[i]), R*Math.sin(starts[i]));
+    sepPath.arc(0,0,R,starts[i],starts[i]+0.006,false);
   }
+  diskPath = new Path2D(); diskPath.arc(0,0,R+1,0,2*Math.PI);
+  hubPath = new Path2D(); hubPath.arc(0,0,innerR,0,2*Math.PI);
+}
+
+// Paint the coloured wedges (no labels, unrotated) into `ctx` (S x S css px).
+function paintWedges(ctx, S){
+  const n = liveCount;
+  ctx.save();
+  ctx.translate(S/2,S/2);
+  for(let i=0;i<n;i++){ ctx.fillStyle = colorCache[i]; ctx.fill(slicePaths[i]); }
+  ctx.lineWidth = 2; ctx.strokeStyle = "#fff"; ctx.stroke(sepPath);
+  ctx.restore();
+}
 
-  // labels anchored at the rim, flowing inward (radial), clipped to wedge
+// Paint the labels at rotation `rot` into `ctx` (S x S css px).
+function paintLabels(ctx, rot, S){
+  const R=S*0.46, innerR=R*0.18, labelStart=innerR+10, labelEnd=R*0.90;
+  const maxW = (labelEnd - labelStart) * 0.95;
+  const n = liveCount, cosRot = Math.cos(rot), sinRot = Math.sin(rot);
+
+  ctx.save();
+  ctx.translate(S/2,S/2);
+  ctx.rotate(rot);
+  ctx.textBaseline = "middle";
+  ctx.fillStyle = "#111";
+  ctx.strokeStyle = "rgba(255,255,255,0.9)";
+
+  // labels anchored at the rim, flowing inward (radial), clipped to wedge.
+  // font/lineWidth are set outside the per-slice save() so restore() keeps
+  // them, and only touched when the fitted size changes between slices.
+  let curFont = 0;
   for(let i=0;i<n;i++){
-    const a1 = rot + i*slice, a2 = rot + (i+1)*slice, mid = (a1+a2)/2;
-    const name = labels[i];
+    const name = labels[liveIdx[i]];
 
-    // clip to the wedge
-    ctx.save();
-    ctx.beginPath(); ctx.moveTo(CX,CY); ctx.arc(CX,CY,R,a1,a2,false); ctx.closePath(); ctx.clip();
+    const font = fitFont(ctx, name, maxW);   // a cache miss leaves ctx.font at FONT_CSS[font]
+    if (font !== curFont){
+      ctx.font = FONT_CSS[font]; ctx.lineWidth = Math.max(2, Math.floor(font/6)); curFont = font;
+    }
 
     ctx.save();
-    ctx.translate(CX,CY);
-    ctx.rotate(mid);
+    ctx.clip(slicePaths[i]);
+    ctx.rotate(midRad[i]);
 
-    // keep text upright on the left side
-    const flipped = Math.cos(mid) < 0;
+    // keep text upright on the left side: cos(rot + mid) < 0
+    const flipped = cosRot*cosMid[i] - sinRot*sinMid[i] < 0;
     if (flipped) ctx.rotate(Math.PI);
 
-    const maxW = (labelEnd - labelStart) * 0.95;
-
-    // auto-fit
-    let font = 18;
-    ctx.font = `700 ${font}px system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif`;
-    let w = ctx.measureText(name).width;
-    while (w > maxW && font > 9){
-      font -= 1;
-      ctx.font = `700 ${font}px system-ui,-apple-system,Segoe UI,Roboto,Arial,sans-serif`;
-      w = ctx.measureText(name).width;
-    }
-
     // anchor at rim, draw inward
     const x = flipped ? -labelEnd : labelEnd;
     ctx.textAlign = flipped ? "left" : "right";
-    ctx.textBaseline = "middle";
-
-    ctx.strokeStyle = "rgba(255,255,255,0.9)";
-    ctx.lineWidth = Math.max(2, Math.floor(font/6));
-    ctx.fillStyle = "#111";
     ctx.strokeText(name, x, 0);
     ctx.fillText(name, x, 0);
 
     ctx.restore();
-    ctx.restore();
   }
+  ctx.restore();
+}
+
+function offscreenLayer(){
+  const off = (typeof OffscreenCanvas !== "undefined")
+    ? new OffscreenCanvas(canvas.width, canvas.height)
+    : Object.assign(document.createElement('canvas'), {width: canvas.width, height: canvas.height});
+  const octx = off.getContext('2d');
+  octx.setTransform(cachedDpr,0,0,cachedDpr,0,0);
+  return [off, octx];
+}
+
+// The wheel only ever rotates, so its two layers are rendered off-screen and
+// each frame is one pattern-filled disk (wedges) plus one blit (labels).
+// Wedges only change with the slice set; labels are also repainted when a
+// spin stops so they end up upright.
+function buildWedgePattern(S){
+  const [off, octx] = offscreenLayer();
+  paintWedges(octx, S);
+  wedgePattern = ctx.createPattern(off, 'no-repeat');
+  // pattern pixels -> css px, centred on the wheel
+  wedgePattern.setTransform(new DOMMatrix([1/cachedDpr, 0, 0, 1/cachedDpr, -S/2, -S/2]));
+}
+function buildWheelBitmap(rot, S){
+  const [off, octx] = offscreenLayer();
+  paintLabels(octx, rot, S);
+  wheelBitmap = off; bitmapRot = rot;
+}
+
+function draw(rot=0){
+  const S = cachedSize, CX=S/2, CY=S/2;
+  if (!slicePaths) buildPaths(S);
+  if (!wedgePattern) buildWedgePattern(S);
+  if (!wheelBitmap) buildWheelBitmap(rot, S);
 
-  // hub
-  ctx.beginPath(); ctx.arc(CX,CY,innerR,0,2*Math.PI);
-  ctx.fillStyle="#fff"; ctx.fill();
-  ctx.lineWidth = 2; ctx.strokeStyle="#333"; ctx.stroke();
+  ctx.clearRect(0,0,S,S);
+  ctx.save();
+  ctx.translate(CX,CY); ctx.rotate(rot);
+  ctx.fillStyle = wedgePattern;
+  ctx.fill(diskPath);
+  ctx.rotate(-bitmapRot); ctx.translate(-CX,-CY);
+  ctx.drawImage(wheelBitmap, 0, 0, S, S);
+  ctx.restore();
+
+  paintHub(ctx, S);
+}
+
+function paintHub(ctx, S){
+  ctx.save();
+  ctx.translate(S/2,S/2);
+  ctx.fillStyle="#fff"; ctx.fill(hubPath);
+  ctx.lineWidth = 2; ctx.strokeStyle="#333"; ctx.stroke(hubPath);
+  ctx.restore();
+}
+
+// PNG export: paint the current rotation off-screen at full resolution (labels
+// upright even mid-spin) and encode it asynchronously.
+function exportPng(){
+  const S = cachedSize;
+  if (!slicePaths) buildPaths(S);
+  const [off, octx] = offscreenLayer();
+  octx.save();
+  octx.translate(S/2,S/2); octx.rotate(rotation); octx.translate(-S/2,-S/2);
+  paintWedges(octx, S);
+  octx.restore();
+  paintLabels(octx, rotation, S);
+  paintHub(octx, S);
+  const blob = off.convertToBlob ? off.convertToBlob({type: "image/png"})
+                                 : new Promise(r => off.toBlob(r, "image/png"));
+  blob.then(b => {
+    if (!b) return;
+    const url = URL.createObjectURL(b);
+    const a = document.createElement('a'); a.download = "wheel.png"; a.href = url; a.click();
+    setTimeout(() => URL.revokeObjectURL(url), 0);
+  });
+}
+
+// Outside the spin loop, fold bursts of redraw requests into one per frame.
+let renderQueued = false;
+function requestRender(){
+  if (renderQueued) return;
+  renderQueued = true;
+  requestAnimationFrame(()=>{ renderQueued = false; if (!spinning) draw(rotation); });
 }
 
 function winnerIndex(rot){
-  const n = Math.max(1, labels.length), slice = 2*Math.PI/n;
+  const n = Math.max(1, liveCount);
   const p = mod(0 - rot, 2*Math.PI); // pointer at angle 0 (right)
-  return Math.min(n-1, Math.floor(p / slice));
+  // binary search: last i with starts[i] <= p
+  let lo = 0, hi = n - 1;
+  while (lo < hi){
+    const mid = (lo + hi + 1) >> 1;
+    if (starts[mid] <= p) lo = mid; else hi = mid - 1;
+  }
+  return lo;
+}
+
+// Uniform [0,1) from the browser's CSPRNG (Math.random() only as a fallback)
+const rngBuf = new Uint32Array(1);
+function rand01(){
+  if (window.crypto && crypto.getRandomValues) return crypto.getRandomValues(rngBuf)[0] / 4294967296;
+  return Math.random();
 }
 
 function spin(){
-  if (spinning || labels.length < 2) return;
+  if (spinning || totalWeight < 2) return;
   spinning = true; setElims(true);
   document.getElementById('winner').textContent = "";
 
-  const total = (INIT.maxSpins||6)*2*Math.PI + Math.random()*2*Math.PI;
+  const total = (INIT.maxSpins||6)*2*Math.PI + rand01()*2*Math.PI;
   const dur = Math.max(400, Math.min(10000, INIT.durationMs||5000));
   const t0 = performance.now(), start = rotation;
 
+  let lastRotKey = -1;   // rotation in 0.1° steps; the ease-out tail repeats keys
+  // Cap drawing near 60 fps without halving 90/100 Hz displays: add up the rAF
+  // intervals and draw once a 60 Hz frame's worth (less 2 ms slack) has built up
+  const FRAME_MS = 1000/60, SLACK_MS = 2;
+  let lastT = t0, frameAcc = FRAME_MS;
+
   const frame = (t)=>{
-    const p = Math.min(1,(t-t0)/dur), k = easeOutCubic(p);
-    rotation = mod(start + total*k, 2*Math.PI);
-    draw(rotation);
+    frameAcc += t - lastT; lastT = t;
+    const p = Math.min(1,(t-t0)/dur), q = 1 - p;   // ease-out cubic: 1 - q^3
+    rotation = mod(start + total - total*q*q*q, 2*Math.PI);
+    const rotKey = Math.round(rotation * 1800 / Math.PI);
+    if (p>=1){ wheelBitmap = null; draw(rotation); }   // repaint so labels end up upright
+    else if (!document.hidden && rotKey !== lastRotKey && frameAcc >= FRAME_MS - SLACK_MS){
+      frameAcc = Math.max(0, Math.min(frameAcc - FRAME_MS, FRAME_MS));
+      lastRotKey = rotKey; draw(rotation);
+    }
     if (p<1) { requestAnimationFrame(frame); }
     else {
-      lastIdx = winnerIndex(rotation);
+      lastIdx = liveIdx[winnerIndex(rotation)];
       const full = fulls[lastIdx] || labels[lastIdx] || "";
       document.getElementById('winner').textContent = "🏆 Winner: " + full;
 
@@ -286,34 +618,60 @@ function setElims(dis){
 }
 function updateCount(){
   document.getElementById('count').textContent =
-    labels.length + " slice" + (labels.length===1?"":"s") + " on wheel";
+    totalWeight + " entr" + (totalWeight===1?"y":"ies") + " on wheel · " +
+    liveCount + " slice" + (liveCount===1?"":"s");
 }
 
 document.getElementById('spinBtn').onclick = spin;
 document.getElementById('resetBtn').onclick = ()=>{
-  labels=[...INIT.labels]; fulls=[...INIT.fulls]; rotation=0; lastIdx=null;
+  weights.set(INIT_WEIGHTS); activeMask.fill(1); rebuildLive(); rotation=0; lastIdx=null; labelsChanged();
   setElims(true); document.getElementById('winner').textContent="";
-  draw(rotation); updateCount();
-};
-document.getElementById('pngBtn').onclick = ()=>{
-  const a=document.createElement('a'); a.download="wheel.png"; a.href=canvas.toDataURL("image/png"); a.click();
+  requestRender(); updateCount();
 };
+document.getElementById('pngBtn').onclick = exportPng;
 document.getElementById('rm1').onclick = ()=>{
   if(lastIdx==null)return;
-  labels.splice(lastIdx,1); fulls.splice(lastIdx,1);
-  lastIdx=null; setElims(true); draw(rotation); updateCount();
+  // one ticket goes; the slice disappears with its last ticket
+  if (--weights[lastIdx] <= 0){ activeMask[lastIdx] = 0; rebuildLive(); }
+  lastIdx=null; labelsChanged(); setElims(true); requestRender(); updateCount();
 };
 document.getElementById('rmAll').onclick = ()=>{
   if(lastIdx==null)return;
-  const n=labels[lastIdx]; const L=[],F=[];
-  for(let i=0;i<labels.length;i++){ if(labels[i]!==n){L.push(labels[i]);F.push(fulls[i]);} }
-  labels=L; fulls=F; lastIdx=null; setElims(true); draw(rotation); updateCount();
+  if (!nameSlots){
+    nameSlots = new Map();
+    for (let i=0;i<labels.length;i++){
+      const g = nameSlots.get(labels[i]);
+      if (g) g.push(i); else nameSlots.set(labels[i], [i]);
+    }
+  }
+  for (const i of nameSlots.get(labels[lastIdx])) activeMask[i] = 0;
+  rebuildLive(); lastIdx=null; labelsChanged(); setElims(true); requestRender(); updateCount();
 };
 
 draw(rotation); updateCount();
 </script>
 """
-    return html.replace("__INIT_JSON__", json.dumps(init))
+
+# Payloads at least this big are shipped gzipped; smaller ones stay plain JSON
+WHEEL_PACK_MIN = 64 * 1024
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def build_wheel_html(init_json: str) -> str:
+    if len(init_json) >= WHEEL_PACK_MIN:
+        packed = base64.b64encode(gzip.compress(init_json.encode("utf-8"), mtime=0)).decode("ascii")
+        init_json = json.dumps({"gz": packed})
+    return WHEEL_HTML.replace("__INIT_JSON__", init_json)
+
+def render_wheel(display_names, full_entries, weights=None):
+    init = {
+        "labels": [str(x) for x in display_names],   # what shows on each slice
+        "fulls":  [str(x) for x in full_entries],    # full "Name - Email - Phone" (winner line)
+        "weights": [int(w) for w in weights] if weights is not None else [1] * len(full_entries),
+        "durationMs": 5000,
+        "minSpins": 6,
+        "maxSpins": 6
+    }
+    return build_wheel_html(json.dumps(init, ensure_ascii=False, sort_keys=True, separators=(",", ":")))
 
 # ---------------- UI ----------------
 st.title("🎟️ Raffle Entries Builder")
@@ -332,16 +690,18 @@ df = None
 
 if uploaded is not None:
     try:
-        xls = pd.ExcelFile(uploaded, engine="openpyxl")
-        sheet_name = st.selectbox("Select worksheet", options=xls.sheet_names, index=0)
-        df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str, engine="openpyxl")
-        st.success(f"Loaded **{sheet_name}** with {len(df):,} rows and {len(df.columns)} columns.")
+        file_bytes = uploaded.getvalue()
+        sheet_name = st.selectbox("Select worksheet", options=list_sheets(file_bytes), index=0)
+        df = load_sheet(file_bytes, sheet_name)
+        n_rows, n_cols = df.shape
+        st.success(f"Loaded **{sheet_name}** with {n_rows:,} rows ({n_cols} of the required columns found).")
+        st.caption("Preview of the selected columns (other columns in the sheet are not loaded).")
         st.dataframe(df.head(10), use_container_width=True)
     except Exception as e:
         st.exception(e)
 
 if df is not None:
-    out_df, info = build_entries(df, id_value=id_value, separator=separator)
+    out_df, info = cached_build_entries(file_bytes, sheet_name, id_value, separator)
 
     if not info.get("ok", False):
         st.error(info.get("message", "Unknown error"))
@@ -359,32 +719,44 @@ if df is not None:
     st.subheader("Preview of generated entries")
     st.dataframe(out_df.head(30), use_container_width=True)
 
-    # Downloads
-    excel_bytes = to_excel_bytes(out_df, header=include_header)
+    # Downloads: CSV is cheap and built up front; the workbook is generated on click
+    export_args = (file_bytes, sheet_name, id_value, separator, include_header)
     st.download_button(
         label="⬇️ Download Excel (.xlsx)",
-        data=excel_bytes,
+        data=partial(cached_xlsx, *export_args),
         file_name="raffle_entries.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
-    csv_bytes = out_df.to_csv(index=False, header=include_header).encode("utf-8")
     st.download_button(
         label="⬇️ Download CSV (.csv)",
-        data=csv_bytes,
+        data=cached_csv(*export_args),
         file_name="raffle_entries.csv",
         mime="text/csv",
     )
 
     st.divider()
 
-    # Wheel inputs
-    full_entries = out_df["Entry"].fillna("").astype(str).tolist()
-    display_names = [(s.partition(" - ")[0].strip() or s) for s in full_entries]  # robust fallback
-
-    if len(display_names) == 0:
+    # Wheel page (kept in session state; toggling export options doesn't change it,
+    # so reruns reuse the same HTML string instead of re-serialising every entry)
+    wheel_key = (getattr(uploaded, "file_id", uploaded.name), sheet_name, id_value, separator)
+    cached = st.session_state.get("wheel_page")
+    if cached is None or cached[0] != wheel_key:
+        # one weighted slice per distinct entry instead of one slice per ticket;
+        # entries are built from cleaned strings, so no NaN/str round-trip first
+        counts = out_df["Entry"].value_counts(sort=False)
+        full_entries = counts.index.tolist()
+        entries = pd.Series(full_entries, dtype=object)
+        names = entries.str.split(" - ", n=1).str[0].str.strip()
+        display_names = names.where(names != "", entries).tolist()  # robust fallback
+        wheel_html = render_wheel(display_names, full_entries, counts.tolist()) if full_entries else None
+        cached = (wheel_key, wheel_html)
+        st.session_state["wheel_page"] = cached
+    wheel_html = cached[1]
+
+    if wheel_html is None:
         st.warning("No entries to spin. Check the ID filter and that Tickets Purchased > 0.")
     else:
-        st_html(render_wheel(display_names, full_entries), height=820, scrolling=False)
+        st_html(wheel_html, height=WHEEL_HEIGHT, scrolling=False)
 
 st.caption("Required headers: ID1, Full Name, Email1, Phone Number, Tickets Purchased.")
 
@@ -398,25 +770,29 @@ try:
 except Exception:
     st_autorefresh = None
 
-live = st.toggle(
-    "⚡ Live update winners",
-    value=False,
-    help="Auto-refresh this section every ~0.8s when on (requires streamlit-autorefresh).",
-)
-if live and st_autorefresh:
-    st_autorefresh(interval=800, key="winners_live_auto")
-elif live and not st_autorefresh:
-    st.info("Install **streamlit-autorefresh** for live updates.")
-
-if streamlit_js_eval is None:
-    st.warning(
-        "To display/export winners automatically, add **streamlit-js-eval** to requirements:\n\n"
-        "`pip install streamlit-js-eval` (or add `streamlit-js-eval` to requirements.txt)"
+# Fragment: the buttons and live polling rerun only this section, not the
+# upload/entries/wheel above (so a refresh doesn't reset the wheel iframe)
+@st.fragment
+def winners_log():
+    live = st.toggle(
+        "⚡ Live update winners",
+        value=False,
+        help="Auto-refresh this section every ~0.8s when on (requires streamlit-autorefresh).",
     )
-else:
-    # Bridge so the iframe (wheel) can push winners to the parent page
-    streamlit_js_eval(
-        js_expressions="""
+    if live and st_autorefresh:
+        st_autorefresh(interval=800, key="winners_live_auto")
+    elif live and not st_autorefresh:
+        st.info("Install **streamlit-autorefresh** for live updates.")
+
+    if streamlit_js_eval is None:
+        st.warning(
+            "To display/export winners automatically, add **streamlit-js-eval** to requirements:\n\n"
+            "`pip install streamlit-js-eval` (or add `streamlit-js-eval` to requirements.txt)"
+        )
+    else:
+        # Bridge so the iframe (wheel) can push winners to the parent page
+        streamlit_js_eval(
+            js_expressions="""
 (() => {
   if (window.__raffle_listener_installed) return 'ok';
   const KEY = 'raffle_winners_v1';
@@ -436,58 +812,49 @@ else:
   window.__raffle_listener_installed = true;
   return 'ok';
 })()
-        """,
-        key="install_raffle_bridge_v1",
-    )
+            """,
+            key="install_raffle_bridge_v1",
+        )
 
-    # Controls — always visible now
-    c1, c2 = st.columns(2)
-    with c1:
-        if st.button("🔄 Refresh winners", use_container_width=True):
-            st.experimental_rerun()
-    with c2:
-        if st.button("🧹 Clear winners log", use_container_width=True):
-            streamlit_js_eval(
-                js_expressions="localStorage.removeItem('raffle_winners_v1');",
-                key="clear_winners_v1",
-            )
-            st.experimental_rerun()
+        # Controls — always visible now
+        c1, c2 = st.columns(2)
+        with c1:
+            # clicking reruns the fragment, which pulls the log again below
+            st.button("🔄 Refresh winners", use_container_width=True)
+        with c2:
+            if st.button("🧹 Clear winners log", use_container_width=True):
+                streamlit_js_eval(
+                    js_expressions="localStorage.removeItem('raffle_winners_v1');",
+                    key="clear_winners_v1",
+                )
+                # Rerun so the cached table drops the cleared winners now. A click
+                # handled by a full run (e.g. merged with another rerun) can't use
+                # scope="fragment", so rerun the whole app then.
+                try:
+                    st.rerun(scope="fragment")
+                except StreamlitAPIException:
+                    st.rerun()
+
+        # Read winners from parent page storage
+        winners_json = streamlit_js_eval(
+            js_expressions="localStorage.getItem('raffle_winners_v1')",
+            key="pull_winners_v1",
+        )
 
-    # Read winners from parent page storage
-    winners_json = streamlit_js_eval(
-        js_expressions="localStorage.getItem('raffle_winners_v1')",
-        key="pull_winners_v1",
-    )
+        wdf = winners_table(winners_json)
+        if len(wdf):
+            st.dataframe(wdf, use_container_width=True)
 
-    winners = []
-    if winners_json:
-        try:
-            winners = json.loads(winners_json)
-        except Exception:
-            winners = []
-
-    if winners:
-        rows = []
-        for i, r in enumerate(winners, start=1):
-            rows.append({
-                "Winner Number": i,
-                "Full Name":     (r.get("name")  or ""),
-                "Email":         (r.get("email") or ""),
-                "Phone Number":  (r.get("phone") or ""),
-            })
-        wdf = pd.DataFrame(rows)
-
-        st.dataframe(wdf, use_container_width=True)
-
-        xbytes = to_excel_bytes(wdf, header=True)
-        st.download_button(
-            "⬇️ Download winners (.xlsx)",
-            data=xbytes,
-            file_name="winners.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    else:
-        st.info("No winners recorded yet. Spin the wheel, then click **Refresh winners** to pull them in.")
+            st.download_button(
+                "⬇️ Download winners (.xlsx)",
+                data=partial(winners_xlsx, winners_json),
+                file_name="winners.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+        else:
+            st.info("No winners recorded yet. Spin the wheel, then click **Refresh winners** to pull them in.")
+
+winners_log()
 
 st.caption("Program developed by Rene Barbier for Soccer Central San Antonio")
 